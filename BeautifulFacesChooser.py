@@ -4,9 +4,12 @@ import os
 
 # Класс для выбора лучшего снимка лица по качеству
 class BeautifulFacesChooser:
-    def __init__(self, min_face_size=50, sharpness_threshold=100):
+    def __init__(self, min_face_size=50, sharpness_threshold=100, use_buffer_pool=False):
         self.min_face_size = min_face_size # минимальный размер лица в пикселях
         self.sharpness_threshold = sharpness_threshold # порог резкости (лапласиан)
+        self.use_buffer_pool = use_buffer_pool # переиспользовать буферы вместо новых массивов на каждый кроп
+        self.gray_buffer = None
+        self.laplacian_buffer = None
 
     # Вычисляет общее качество лица по размеру и резкости, возвращает оценку качества от 0 до 1
     def calculate_face_quality(self, face_image, bbox):
@@ -44,8 +47,11 @@ class BeautifulFacesChooser:
     def _calculate_sharpness_score(self, face_image):
 
         try:
-            gray = cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY)
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+            if self.use_buffer_pool:
+                laplacian_var = self._buffered_laplacian_var(face_image)
+            else:
+                gray = cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY)
+                laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
 
             # Нормализуем оценку резкости
             sharpness_score = min(1.0, laplacian_var / self.sharpness_threshold)
@@ -54,6 +60,33 @@ class BeautifulFacesChooser:
         except Exception:
             return 0.0
 
+    # Дисперсия лапласиана без выделения памяти: кроп пишется в срезы общих буферов
+    def _buffered_laplacian_var(self, face_image):
+
+        height, width = face_image.shape[:2]
+
+        # Буферы только растут, поэтому для большинства кропов новых массивов не создаётся
+        if self.gray_buffer is None or self.gray_buffer.shape[0] < height or self.gray_buffer.shape[1] < width:
+            buffer_h = max(height, self.gray_buffer.shape[0] if self.gray_buffer is not None else 0)
+            buffer_w = max(width, self.gray_buffer.shape[1] if self.gray_buffer is not None else 0)
+            self.gray_buffer = np.empty((buffer_h, buffer_w), dtype=np.uint8)
+            self.laplacian_buffer = np.empty((buffer_h, buffer_w), dtype=np.float32)
+
+        gray = self.gray_buffer[:height, :width]
+        laplacian = self.laplacian_buffer[:height, :width]
+        cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY, dst=gray)
+        # Лапласиан от uint8 точно представим во float32, дисперсию считает meanStdDev в double
+        cv2.Laplacian(gray, cv2.CV_32F, dst=laplacian)
+        _, std = cv2.meanStdDev(laplacian)
+
+        return float(std[0, 0]) ** 2
+
+    # Освобождение буферов резкости
+    def release_buffers(self):
+
+        self.gray_buffer = None
+        self.laplacian_buffer = None
+
     # Сравнивает качество текущего лица с существующим, возвращает True если текущее лицо лучше
     # def is_better_quality(self, current_face, current_bbox, existing_face_path, existing_bbox):
     #     # Вычисляем качество текущего лица
@@ -1,6 +1,7 @@
 from FaceDetector import FaceDetector
 from Tracker import Tracker
 import cv2
+import numpy as np
 from UniqueFacesWriter import UniqueFacesWriter
 
 
@@ -8,22 +9,33 @@ class FaceDetectionManager:
     def __init__(self, detection_interval=2, confidence_threshold=0.9, tracker_type='csrt',
                  iou_threshold=0.4,
                  meta_output_dir="unique_faces", similarity_threshold=0.6,
-                 padding=15, min_face_size=50, sharpness_threshold=100):
+                 padding=15, min_face_size=50, sharpness_threshold=100,
+                 descriptor_dtype=None, use_buffer_pool=False,
+                 track_interval=1):
+        if track_interval is not None and (not isinstance(track_interval, int) or track_interval < 1):
+            raise ValueError(f"переданное значение {track_interval} не соответствует ни одному из возможных значений")
+
         self.detector = FaceDetector(
             detection_interval_seconds=detection_interval,
-            confidence_threshold=confidence_threshold
+            confidence_threshold=confidence_threshold,
+            use_buffer_pool=use_buffer_pool
         )
         self.tracker = Tracker(tracker_type, iou_threshold=iou_threshold)
         self.unique_manager = UniqueFacesWriter(output_dir=meta_output_dir,
                                                 similarity_threshold=similarity_threshold,
                                                 padding=padding, min_face_size=min_face_size,
-                                                sharpness_threshold=sharpness_threshold)
+                                                sharpness_threshold=sharpness_threshold,
+                                                descriptor_dtype=descriptor_dtype,
+                                                use_buffer_pool=use_buffer_pool)
         self.frame_count = 0
         self.fps = None
+        self.use_buffer_pool = use_buffer_pool    # декодировать кадры в заранее выделенные буферы
+        self.frame_buffer = None    # буфер, в который декодируется кадр в режиме use_buffer_pool
+        self.track_interval = track_interval    # в разреженном режиме трекинг каждые k кадров (None - без трекинга)
 
 
     # Обработка видео с детекцией, трекингом и анализом уникальности
-    def process_video(self, video_path, output_path=None):
+    def process_video(self, video_path, output_path=None, display=True, seek=False):
 
         cap = self.detector.setup_video(video_path)
         self.fps = cap.get(cv2.CAP_PROP_FPS)
@@ -34,32 +46,72 @@ class FaceDetectionManager:
         else:
             out = None
 
+        if self.use_buffer_pool:
+            self.frame_buffer = self._setup_frame_buffer(cap)
+
+        # Без вывода в файл и на экран нужны только кадры детекции и кадры трекинга (каждые track_interval)
+        sparse = not output_path and not display
+        # Перемотка к следующему нужному кадру - по запросу: FFmpeg перематывает к ключевому кадру
+        # и декодирует от него до цели, поэтому выигрыш есть, только когда шаг длиннее GOP
+        seek = seek and sparse
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if sparse:
+            print("Разреженный режим: обрабатываются только кадры детекции и трекинга")
+
         print("Запуск детекции, трекинга и логгирования...")
 
         try:
             while True:
-                ret, frame = cap.read()
-                if not ret:
+                if seek:
+                    next_frame = self._next_sparse_frame()
+                    if 0 < total_frames < next_frame:
+                        # Следующий нужный кадр за концом видео
+                        break
+                    if next_frame > self.frame_count + 1:
+                        seek = self._seek_to_frame(cap, next_frame)
+
+                # В бэкендах FFmpeg и MSMF декодирование происходит уже в grab(),
+                # retrieve() только конвертирует кадр в BGR и копирует его
+                if not cap.grab():
                     break
 
                 self.detector.frame_count += 1
                 self.frame_count += 1
 
+                # Время считается по номеру кадра, поэтому пропущенные кадры его не сбивают
                 current_video_time = self.frame_count / self.fps if self.fps > 0 else 0
 
-                # Логирование
-                if self.frame_count % 30 == 0:
+                # Логирование (в разреженном режиме счётчик идёт скачками, там логируется каждая детекция)
+                if not sparse and self.frame_count % 30 == 0:
                     active_tracks = len(self.tracker.get_active_tracks())
                     print(f"Кадр {self.frame_count}, активных треков: {active_tracks}")
 
-                # ОБНОВЛЕНИЕ ТРЕКЕРОВ - происходит на каждом кадре
-                tracks = self.tracker.update_trackers(frame)
+                need_detection = self.detector.should_detect_faces()
+                if sparse:
+                    need_tracking = self.track_interval is not None and self.frame_count % self.track_interval == 0
+                else:
+                    need_tracking = True
+
+                # Без перемотки лишние кадры всё равно декодируются в grab(), пропускаются только конвертация и копия
+                if sparse and not need_detection and not need_tracking:
+                    continue
+
+                ret, frame = self._retrieve_frame(cap)
+                if not ret:
+                    break
+
+                # ОБНОВЛЕНИЕ ТРЕКЕРОВ - на каждом кадре, в разреженном режиме каждые track_interval кадров
+                if need_tracking:
+                    tracks = self.tracker.update_trackers(frame)
+                else:
+                    tracks = self.tracker.get_active_tracks()
 
                 # ДЕТЕКЦИЯ - только каждые 2 секунды
-                if self.detector.should_detect_faces():
+                if need_detection:
                     detections = self.detector.detect_faces_in_frame(frame)
                     print(f"Обнаружено {len(detections)} лиц")
-                    self.tracker.add_detections(frame, detections)
+                    if not sparse or self.track_interval is not None:
+                        self.tracker.add_detections(frame, detections)
 
                     # АНАЛИЗ УНИКАЛЬНОСТИ для новых обнаружений
                     for detection in detections:
@@ -69,21 +121,72 @@ class FaceDetectionManager:
                         if is_new:
                             print(f"Обнаружено новое уникальное лицо. ID: {face_id}")
 
+                if sparse:
+                    continue
+
                 # Отрисовка результатов
                 frame = self._draw_combined_results(frame, tracks)
 
                 # Отображение
-                cv2.imshow('Face Detection & Tracking', frame)
+                if display:
+                    cv2.imshow('Face Detection & Tracking', frame)
 
                 if out and out.isOpened():
                     out.write(frame)
 
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                if display and cv2.waitKey(1) & 0xFF == ord('q'):
                     break
 
         finally:
-            self._cleanup(cap, out)
+            self._cleanup(cap, out, display)
+
+
+    # Номер ближайшего кадра, нужного разреженному режиму: детекция или трекинг
+    def _next_sparse_frame(self):
+
+        next_frame = self.frame_count + 1
+        # should_detect_faces срабатывает, когда frame_count % frame_interval == 1
+        needed_frame = next_frame + (1 - next_frame) % self.detector.frame_interval
+        if self.track_interval is not None:
+            needed_frame = min(needed_frame, next_frame + (-next_frame) % self.track_interval)
+        return needed_frame
+
+    # Перемотка так, чтобы следующий grab() вернул кадр target_frame (нумерация с 1)
+    def _seek_to_frame(self, cap, target_frame):
+
+        if not cap.set(cv2.CAP_PROP_POS_FRAMES, target_frame - 1):
+            print("Перемотка не поддерживается, кадры читаются последовательно через grab()")
+            return False
+
+        # Пропущенные кадры учитываем в счётчиках, чтобы время для _format_video_time оставалось верным
+        self.frame_count = target_frame - 1
+        self.detector.frame_count = target_frame - 1
+        return True
+
+    # Декодирование захваченного кадра (в общий буфер, если он включен)
+    def _retrieve_frame(self, cap):
+
+        if not self.use_buffer_pool:
+            return cap.retrieve()
+
+        # Цикл синхронный, кадр не нужен после итерации, поэтому одного буфера достаточно
+        ret, frame = cap.retrieve(self.frame_buffer)
+        if ret:
+            # Если декодер выделил новый массив (другой размер), он становится буфером
+            self.frame_buffer = frame
+        return ret, frame
+
+    # Предвыделение кадрового буфера под размер видео
+    def _setup_frame_buffer(self, cap):
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        if width <= 0 or height <= 0:
+            # Размер неизвестен - буфер появится после первого чтения
+            return None
 
+        return np.empty((height, width, 3), dtype=np.uint8)
 
     # Отрисовка треков и информации
     def _draw_combined_results(self, frame, tracks):
@@ -111,10 +214,15 @@ class FaceDetectionManager:
         return frame
 
     # Освобождение ресурсов
-    def _cleanup(self, cap, out):
+    def _cleanup(self, cap, out, display):
 
         cap.release()
         if out and out.isOpened():
             out.release()
-        cv2.destroyAllWindows()
+        # Буферы освобождаются, чтобы не держать память кадра после обработки
+        self.frame_buffer = None
+        self.detector.release_buffers()
+        self.unique_manager.quality_selector.release_buffers()
+        if display:
+            cv2.destroyAllWindows()
         print(f"Обработка завершена. Всего кадров: {self.frame_count}")
\ No newline at end of file
@@ -1,11 +1,12 @@
 import cv2
+import numpy as np
 from mtcnn import MTCNN
 import os
 
 
 # Класс для обнаружения лиц на видео с заданным интервалом
 class FaceDetector:
-    def __init__(self, detection_interval_seconds=2, confidence_threshold=0.9):
+    def __init__(self, detection_interval_seconds=2, confidence_threshold=0.9, use_buffer_pool=False):
         self.detector = MTCNN()
         self.detection_interval_seconds = detection_interval_seconds   # интервал обнаружения в секундах
         self.confidence_threshold = confidence_threshold    # порог уверенности для обнаружения лиц
@@ -13,6 +14,8 @@ class FaceDetector:
         self.last_results = []
         self.frame_interval = 0
         self.fps = 0
+        self.use_buffer_pool = use_buffer_pool    # переиспользовать RGB буфер между кадрами
+        self.rgb_buffer = None
 
     # Настройка видео потока
     def setup_video(self, video_path):
@@ -48,7 +51,12 @@ class FaceDetector:
     # Обнаружение лиц в одном кадре
     def detect_faces_in_frame(self, frame):
 
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self.use_buffer_pool:
+            if self.rgb_buffer is None or self.rgb_buffer.shape != frame.shape:
+                self.rgb_buffer = np.empty_like(frame)
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb_buffer)
+        else:
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         results = self.detector.detect_faces(rgb_frame)
 
         # Форматируем результаты для трекера
@@ -64,6 +72,11 @@ class FaceDetector:
 
         return formatted_results
 
+    # Освобождение RGB буфера
+    def release_buffers(self):
+
+        self.rgb_buffer = None
+
     # Проверка, нужно ли выполнять обнаружение на текущем кадре
     def should_detect_faces(self):
 
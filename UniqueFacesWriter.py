@@ -8,18 +8,35 @@ from concurrent.futures import ProcessPoolExecutor
 
 from BeautifulFacesChooser import BeautifulFacesChooser
 
+# Допустимые компактные представления дескрипторов лиц
+DESCRIPTOR_DTYPES = (None, 'float16', 'uint8')
+UINT8_SCALE = 255  # гистограммы неотрицательны, знаковый диапазон не нужен
+DESCRIPTOR_SIZE = 3 * 64  # три гистограммы по 64 бина
+INITIAL_GALLERY_CAPACITY = 16
+
 
 # Класс для отслеживания уникальных лиц и сохранения их в файлы
 class UniqueFacesWriter:
-    def __init__(self, output_dir="unique_faces", similarity_threshold=0.6, padding=15, min_face_size=50, sharpness_threshold=100):
+    def __init__(self, output_dir="unique_faces", similarity_threshold=0.6, padding=15, min_face_size=50, sharpness_threshold=100,
+                 descriptor_dtype=None, use_buffer_pool=False):
+        if descriptor_dtype not in DESCRIPTOR_DTYPES:
+            raise ValueError(f"переданное значение {descriptor_dtype} не соответствует ни одному из возможных значений")
+
         self.output_dir = output_dir    # директория для сохранения уникальных лиц
         self.similarity_threshold = similarity_threshold    # порог схожести лиц (0-1)
         self.known_faces = []  # Список известных лиц
+        # Компактный режим: None - списки float в known_faces, 'float16'/'uint8' - квантованные
+        # L2-нормированные дескрипторы в массиве face_descriptors (первые descriptor_count строк
+        # совпадают с known_faces, ёмкость удваивается при заполнении)
+        self.descriptor_dtype = descriptor_dtype
+        self.face_descriptors = None
+        self.descriptor_count = 0
         self.padding = padding
         self.face_counter = 0
         self.lock = threading.Lock()
 
-        self.quality_selector = BeautifulFacesChooser(min_face_size=min_face_size, sharpness_threshold=sharpness_threshold)
+        self.quality_selector = BeautifulFacesChooser(min_face_size=min_face_size, sharpness_threshold=sharpness_threshold,
+                                                      use_buffer_pool=use_buffer_pool)
 
         self.process_pool = ProcessPoolExecutor(max_workers=2) # process pool для мультипроцесинга
 
@@ -37,22 +54,52 @@ class UniqueFacesWriter:
             if os.path.exists(metadata_file):
                 with open(metadata_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    self.known_faces = data.get('known_faces', [])
-                    self.face_counter = data.get('face_counter', 0)
+                known_faces = data.get('known_faces', [])
+                self.face_counter = data.get('face_counter', 0)
+                stored_dtype = data.get('descriptor_dtype')
+                if stored_dtype != self.descriptor_dtype:
+                    print(f"Дескрипторы сохранены в формате {stored_dtype}, будут приведены к {self.descriptor_dtype}")
+                # Массив строится до изменения состояния, чтобы при ошибке галерея не рассинхронизировалась
+                if self.descriptor_dtype is not None:
+                    self._build_descriptor_store(known_faces)
+                self.known_faces = known_faces
                 print(f"Загружено {len(self.known_faces)} известных лиц")
         except Exception as e:
             print(f"Ошибка загрузки метаданных: {e}")
 
 
+    # Перенос признаков загруженных лиц в массив квантованных дескрипторов
+    def _build_descriptor_store(self, known_faces):
+        capacity = max(INITIAL_GALLERY_CAPACITY, len(known_faces))
+        descriptors = np.zeros((capacity, DESCRIPTOR_SIZE), dtype=self.descriptor_dtype)
+        for i, face in enumerate(known_faces):
+            descriptors[i] = self._quantize_features(face.get('features', []))
+
+        # Списки признаков удаляются только после того, как заполнены все строки
+        for face in known_faces:
+            face.pop('features', None)
+        self.face_descriptors = descriptors
+        self.descriptor_count = len(known_faces)
+
+
     # Сохранение метаданных в файл
     def _save_metadata(self):
         try:
             metadata_file = os.path.join(self.output_dir, "faces_metadata.json")
+            known_faces = self.known_faces
+            if self.descriptor_dtype is not None:
+                # В JSON пишем квантованные значения (для uint8 - целые числа)
+                known_faces = []
+                descriptors = self.face_descriptors[:self.descriptor_count]
+                for face, descriptor in zip(self.known_faces, descriptors):
+                    known_faces.append(dict(face, features=descriptor.tolist()))
             data = {
-                'known_faces': self.known_faces,
+                'known_faces': known_faces,
                 'face_counter': self.face_counter,
                 'last_updated': datetime.now().isoformat()
             }
+            if self.descriptor_dtype is not None:
+                data['descriptor_dtype'] = self.descriptor_dtype
             with open(metadata_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
                 print(f"Метаданные сохранены")
@@ -112,6 +159,35 @@ class UniqueFacesWriter:
         # print(f"Похожесть нового лица на то, что уже было: {similarity}")
         return similarity
 
+    # L2-нормирование и квантование признаков в компактный дескриптор
+    def _quantize_features(self, features):
+
+        features = np.asarray(features, dtype=np.float32)
+        if features.size == 0:
+            return np.zeros(DESCRIPTOR_SIZE, dtype=self.descriptor_dtype)
+        if features.shape != (DESCRIPTOR_SIZE,):
+            raise ValueError(f"ожидалось {DESCRIPTOR_SIZE} признаков, получено {features.size}")
+
+        norm = np.linalg.norm(features)
+        if norm == 0:
+            return np.zeros(DESCRIPTOR_SIZE, dtype=self.descriptor_dtype)
+        features = features / norm
+
+        if self.descriptor_dtype == 'uint8':
+            return np.round(np.clip(features, 0, 1) * UINT8_SCALE).astype(np.uint8)
+        return features.astype(np.float16)
+
+    # Сравнение квантованного дескриптора со всеми дескрипторами галереи сразу
+    def _compare_quantized(self, descriptor):
+
+        # Дескрипторы уже нормированы, поэтому косинусная схожесть - это скалярное произведение
+        # einsum расширяет тип по частям, полная расширенная копия галереи не создаётся
+        descriptors = self.face_descriptors[:self.descriptor_count]
+        if self.descriptor_dtype == 'uint8':
+            dots = np.einsum('ij,j->i', descriptors, descriptor, dtype=np.uint32)
+            return dots / float(UINT8_SCALE * UINT8_SCALE)
+        return np.einsum('ij,j->i', descriptors, descriptor, dtype=np.float32)
+
 
     # Проверка, является ли лицо новым
     def is_new_face(self, face_features):
@@ -119,6 +195,15 @@ class UniqueFacesWriter:
         if not self.known_faces:
             return True, None
 
+        if self.descriptor_dtype is not None:
+            if self.descriptor_count == 0:
+                return True, None
+            similarities = self._compare_quantized(self._quantize_features(face_features))
+            best_index = int(np.argmax(similarities))
+            if similarities[best_index] > self.similarity_threshold:
+                return False, self.known_faces[best_index]['face_id']
+            return True, None
+
         best_similarity = 0
         best_face_id = None
 
@@ -156,6 +241,10 @@ class UniqueFacesWriter:
                     break
 
             with self.lock:
+                if self.descriptor_dtype is not None:
+                    # Признаки хранятся только в массиве дескрипторов
+                    self._store_descriptor(existing_index, face_features)
+
                 if existing_index != -1:
                     # Обновляем существующую запись
                     self.known_faces[existing_index].update({
@@ -163,6 +252,8 @@ class UniqueFacesWriter:
                         'features': face_features.tolist() if face_features is not None else [],
                         'quality': face_quality
                     })
+                    if self.descriptor_dtype is not None:
+                        del self.known_faces[existing_index]['features']
                     print(f"Обновлено лицо ID: {face_id}")
                 else:
                     # Добавляем новую запись
@@ -173,6 +264,8 @@ class UniqueFacesWriter:
                         'features': face_features.tolist() if face_features is not None else [],
                         'quality': face_quality
                     })
+                    if self.descriptor_dtype is not None:
+                        del self.known_faces[-1]['features']
                     print(f"Сохранено новое лицо. ID: {face_id} в файл: {filename}")
 
                 self._save_metadata()
@@ -184,6 +277,26 @@ class UniqueFacesWriter:
             return False
 
 
+    # Запись квантованного дескриптора в массив галереи (обновление строки или добавление новой)
+    def _store_descriptor(self, index, face_features):
+
+        descriptor = self._quantize_features(face_features if face_features is not None else [])
+        if index != -1:
+            self.face_descriptors[index] = descriptor
+            return
+
+        if self.face_descriptors is None:
+            self.face_descriptors = np.zeros((INITIAL_GALLERY_CAPACITY, DESCRIPTOR_SIZE), dtype=self.descriptor_dtype)
+        elif self.descriptor_count == len(self.face_descriptors):
+            # Удваиваем ёмкость, чтобы добавление нового лица в среднем было O(1)
+            grown = np.zeros((2 * len(self.face_descriptors), DESCRIPTOR_SIZE), dtype=self.descriptor_dtype)
+            grown[:self.descriptor_count] = self.face_descriptors
+            self.face_descriptors = grown
+
+        self.face_descriptors[self.descriptor_count] = descriptor
+        self.descriptor_count += 1
+
+
     # Основной метод обработки лица
     def process_face(self, frame, bbox, video_time=None):
 